@@ -2,12 +2,26 @@ import os
 import time
 import logging
 import re
-import pandas as pd
+import base64
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
 from O365 import Account
 from dotenv import load_dotenv
 from datetime import datetime
-from bs4 import BeautifulSoup
-from io import StringIO
+import lxml.html
+from lxml import etree
+from io import BytesIO, StringIO
+# Optional Rust-backed Excel reader; pandas only knows engine='calamine' from 2.2 on.
+# The version is read from package metadata so pandas itself stays a lazy import.
+try:
+    import python_calamine  # noqa: F401
+    _PANDAS_VERSION = tuple(int(x) for x in re.findall(r'\d+', metadata.version('pandas'))[:2])
+    _XL_ENGINE = 'calamine' if _PANDAS_VERSION >= (2, 2) else 'openpyxl'
+except Exception:
+    _XL_ENGINE = 'openpyxl'
+# pandas is imported inside the functions that use it (it dominates cold-start
+# time); bs4 likewise, since it is only the fallback when lxml can't parse a body.
 
 # --- 1. PATHS & LOGGING SETUP ---
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -16,9 +30,6 @@ project_root = os.path.dirname(current_script_dir)
 INVENTORY_FILE = os.path.join(project_root, 'data', 'inventory_synced.xlsx')
 LOG_FILE = os.path.join(project_root, 'logs', 'bot.log')
 ENV_FILE = os.path.join(project_root, '.env')
-TEMP_DIR = os.path.join(project_root, 'data', 'temp_attachments')
-
-os.makedirs(TEMP_DIR, exist_ok=True)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -52,8 +63,27 @@ else:
 
 credentials = (CLIENT_ID, CLIENT_SECRET)
 
+# Emails processed concurrently per poll (Outlook allows an app 4 concurrent requests per mailbox)
+MAX_WORKERS = 4
+
 # --- 3. INTELLIGENT PARSING FUNCTIONS ---
 
+# Regex Filters (compiled once, reused for every line/token)
+_QTY_RE = re.compile(r'(?:QTY|QUANTITY|COUNT)[:\s]+(\d+)|(\d+)\s*(?:EA|EACH|PC|PCS)', re.IGNORECASE)
+_EXPLICIT_PART_RE = re.compile(r'(?:P/N|PN|PART|PART NO|PART NUMBER|ALT|ALTERNATE)[:\s]+([A-Z0-9\-\.]+)', re.IGNORECASE)
+_DIGITS = frozenset('0123456789')
+_TOKEN_PUNCT = '.,:;()[]"'
+_IGNORE_TOKENS = frozenset({
+    'QTY', 'REQ', 'UM', 'EA', 'EACH', 'DESC', 'DESCRIPTION', 'REV', 'DATE', 
+    'SIGNED', 'DELIVERED', 'BY', 'AND', 'OR', 'TO', 'FROM', 'SUBJECT', 'SENT', 
+    'CC', 'HI', 'HELLO', 'REGARDS', 'THANKS', 'BOLT', 'SCREW', 'WASHER', 'NUT', 
+    'PIN', 'RIVET', 'COLLAR', 'BUSHING', 'SEAL', 'SUPPORT', 'BEARING', 'CLAMP',
+    'SN', 'S/N', 'SERIAL', 'AWB', 'OUTBOUND', 'SHIPPING', 'COMPANY', 'ACCOUNT',
+    'USED', 'NOTES', 'TRACKING', 'PHONE', 'FAX', 'NEEDED', 'ASSEMBLY', 'ASSY'
+})
+# Tokens that look numeric but are not parts: phone, date, N-number (tail), ordinal
+_REJECT_TOKEN_RE = re.compile(r'^(?:\d{3}-\d{3}-\d{4}|\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|N\d.*|\d+(?:ST|ND|RD|TH))$', re.IGNORECASE)
+
 def find_column_by_name(df, keywords):
     """Helper to find a column matching a list of keywords."""
     # Create a map of {upper_col_name: real_col_name}
@@ -63,9 +93,43 @@ def find_column_by_name(df, keywords):
             return cols[kw]
     return None
 
-def extract_data_from_text(text):
+def table_to_items(df, part_col, qty_col):
+    """Converts a parsed table to [{'part': X, 'req_qty': Y}, ...] (column-wise, no iterrows)."""
+    import pandas as pd
+    parts = df[part_col].fillna('').astype(str).str.strip().str.upper()
+    mask = parts.ne('') & parts.ne('NAN')
+    parts = parts[mask]
+    if qty_col:
+        qtys = pd.to_numeric(df[qty_col][mask], errors='coerce').fillna(1).astype(int).tolist()
+    else:
+        qtys = [1] * len(parts)
+    return [{'part': p, 'req_qty': q} for p, q in zip(parts.tolist(), qtys)]
+
+def html_to_text(html):
+    """Strips HTML to text, one line per text node (same output as BS4 get_text with a newline separator)."""
+    if not html: return ""
+    try:
+        root = lxml.html.fromstring(html)
+        etree.strip_elements(root, 'script', 'style', with_tail=False)
+        return "\n".join(root.itertext())
+    except Exception:
+        # lxml rejects e.g. empty documents or str bodies with an encoding declaration
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(html, "html.parser").get_text(separator="\n")
+
+def excel_read_options(filename):
+    """pd.read_excel/ExcelFile engine options: calamine if installed, else openpyxl read-only for .xlsx."""
+    if _XL_ENGINE == 'calamine':
+        return {'engine': 'calamine'}
+    if filename.lower().endswith('.xlsx'):
+        return {'engine': 'openpyxl', 'engine_kwargs': {'read_only': True}}
+    return {}
+
+def extract_data_from_text(text, known_parts=None):
     """
     Parses text line-by-line to associate Parts with Quantities.
+    known_parts (e.g. the inventory index) lets tokens that are already
+    known part numbers skip the heuristic filters.
     Returns list of dicts: [{'part': 'ABC', 'req_qty': 2}, ...]
     """
     results = []
@@ -73,19 +137,6 @@ def extract_data_from_text(text):
     
     lines = text.splitlines()
     
-    # Regex Filters
-    qty_regex = re.compile(r'(?:QTY|QUANTITY|COUNT)[:\s]+(\d+)|(\d+)\s*(?:EA|EACH|PC|PCS)', re.IGNORECASE)
-    explicit_part_regex = re.compile(r'(?:P/N|PN|PART|PART NO|PART NUMBER|ALT|ALTERNATE)[:\s]+([A-Z0-9\-\.]+)', re.IGNORECASE)
-    
-    ignore_tokens = {
-        'QTY', 'REQ', 'UM', 'EA', 'EACH', 'DESC', 'DESCRIPTION', 'REV', 'DATE', 
-        'SIGNED', 'DELIVERED', 'BY', 'AND', 'OR', 'TO', 'FROM', 'SUBJECT', 'SENT', 
-        'CC', 'HI', 'HELLO', 'REGARDS', 'THANKS', 'BOLT', 'SCREW', 'WASHER', 'NUT', 
-        'PIN', 'RIVET', 'COLLAR', 'BUSHING', 'SEAL', 'SUPPORT', 'BEARING', 'CLAMP',
-        'SN', 'S/N', 'SERIAL', 'AWB', 'OUTBOUND', 'SHIPPING', 'COMPANY', 'ACCOUNT',
-        'USED', 'NOTES', 'TRACKING', 'PHONE', 'FAX', 'NEEDED', 'ASSEMBLY', 'ASSY'
-    }
-
     for line in lines:
         clean_line = line.strip()
         if not clean_line: continue
@@ -96,13 +147,13 @@ def extract_data_from_text(text):
             continue
 
         # 1. Check for Quantity Line (e.g., "Qty: 2")
-        qty_match = qty_regex.search(clean_line)
+        qty_match = _QTY_RE.search(clean_line)
         if qty_match:
             # Extract number (group 1 or group 2 depending on regex match)
             qty_str = qty_match.group(1) or qty_match.group(2)
             try:
                 found_qty = int(qty_str)
-            except:
+            except Exception:
                 found_qty = 1
             
             # Apply this Qty to all parts found in the current block
@@ -117,25 +168,26 @@ def extract_data_from_text(text):
         line_parts = set()
         
         # A. Explicit matches (PN: 123)
-        explicit = explicit_part_regex.findall(clean_line)
+        explicit = _EXPLICIT_PART_RE.findall(clean_line)
         for p in explicit:
             clean_p = p.upper().strip('.,:; ')
             if len(clean_p) > 2:
                 line_parts.add(clean_p)
 
         # B. Implicit matches (Word scanning)
-        tokens = clean_line.split()
+        # upper_line is already upper-cased: tokens only need their edge punctuation stripped
+        tokens = upper_line.split()
         for token in tokens:
-            t = token.upper().strip('.,:;()[]"')
+            t = token.strip(_TOKEN_PUNCT)
             
             if len(t) < 3: continue
-            if not any(c.isdigit() for c in t): continue 
-            if re.match(r'^\d{3}-\d{3}-\d{4}$', t): continue 
-            if re.match(r'^\d{1,2}[/-]\d{1,2}[/-]\d{2,4}$', t): continue 
-            if re.match(r'^N\d', t): continue 
-            if re.match(r'^\d+(ST|ND|RD|TH)$', t): continue 
+            if known_parts and t in known_parts:
+                line_parts.add(t)
+                continue
+            if _DIGITS.isdisjoint(t): continue 
+            if _REJECT_TOKEN_RE.match(t): continue 
 
-            if t not in ignore_tokens:
+            if t not in _IGNORE_TOKENS:
                 line_parts.add(t)
         
         # Add found parts to current pending block
@@ -147,42 +199,34 @@ def extract_data_from_text(text):
 
     return results
 
-def extract_data_from_email(message):
+def extract_data_from_email(message, known_parts=None):
     """Master parser returning list of {'part': X, 'req_qty': Y}."""
+    import pandas as pd
     
     # --- 1. Attachments ---
     if message.has_attachments:
         for attachment in message.attachments:
             if attachment.name.lower().endswith(('.xlsx', '.xls')):
                 try:
-                    save_path = os.path.join(TEMP_DIR, attachment.name)
-                    attachment.save(TEMP_DIR)
-                    df = pd.read_excel(save_path)
+                    # Graph returns file attachments as base64 contentBytes: parse in memory
+                    buf = BytesIO(base64.b64decode(attachment.content))
+                    df = pd.read_excel(buf, dtype=str, **excel_read_options(attachment.name))
                     
                     part_col = find_column_by_name(df, ['P/N', 'PN', 'PART', 'PART NUMBER', 'ITEM'])
                     qty_col = find_column_by_name(df, ['QTY', 'QUANTITY', 'REQ', 'QTY REQ'])
                     
                     if part_col:
-                        extracted = []
-                        for _, row in df.iterrows():
-                            p = str(row[part_col]).strip().upper()
-                            if p and p != 'NAN':
-                                try:
-                                    q = int(row[qty_col]) if qty_col else 1
-                                except:
-                                    q = 1
-                                extracted.append({'part': p, 'req_qty': q})
-                        
-                        os.remove(save_path)
-                        return extracted, f"Excel ({attachment.name})"
+                        return table_to_items(df, part_col, qty_col), f"Excel ({attachment.name})"
                 except Exception as e:
                     logging.error(f"Excel Parse Error: {e}")
 
     # --- 2. HTML Tables ---
-    if message.body:
+    body = message.body or ""
+    # Cheap substring check first: plain conversational bodies never need a DOM parse
+    if '<table' in body.lower():
         try:
-            html_content = StringIO(message.body)
-            dfs = pd.read_html(html_content)
+            html_content = StringIO(body)
+            dfs = pd.read_html(html_content, flavor='lxml')
             for df in dfs:
                 # Standard Table
                 part_col = find_column_by_name(df, ['P/N', 'PN', 'PART', 'PART NUMBER'])
@@ -198,28 +242,16 @@ def extract_data_from_email(message):
                     df = df_promoted
 
                 if part_col:
-                    extracted = []
-                    for _, row in df.iterrows():
-                        p = str(row[part_col]).strip().upper()
-                        if p and p != 'NAN':
-                            try:
-                                q = int(row[qty_col]) if qty_col else 1
-                            except:
-                                q = 1
-                            extracted.append({'part': p, 'req_qty': q})
-                    return extracted, "HTML Table"
-        except:
+                    return table_to_items(df, part_col, qty_col), "HTML Table"
+        except Exception:
             pass 
 
     # --- 3. Text Scanner ---
-    try:
-        soup = BeautifulSoup(message.body, "html.parser")
-        body_text = soup.get_text(separator="\n")
-    except:
-        body_text = "" 
+    # Single HTML-to-text pass (html_to_text handles unparseable bodies itself)
+    body_text = html_to_text(body)
 
     full_text = f"{message.subject}\n{body_text}"
-    return extract_data_from_text(full_text), "Text Scanner"
+    return extract_data_from_text(full_text, known_parts), "Text Scanner"
 
 # --- 4. CORE LOGIC ---
 
@@ -229,13 +261,53 @@ def download_from_sharepoint(account):
         site = account.sharepoint().get_site(SP_HOST, SP_SITE_PATH)
         drive = site.get_default_document_library()
         item = drive.get_item_by_path(SP_FILE_PATH)
-        item.download(to_path=os.path.dirname(INVENTORY_FILE))
+
+        # The local copy's mtime is stamped with the SharePoint edit time after each download,
+        # so an unchanged timestamp means nothing to fetch (tolerance covers filesystem rounding)
+        data_dir = os.path.dirname(INVENTORY_FILE)
+        local_path = os.path.join(data_dir, item.name)
+        remote_ts = item.modified.timestamp() if item.modified else None
+        if remote_ts and os.path.exists(local_path):
+            if abs(os.path.getmtime(local_path) - remote_ts) < 1:
+                return True
+
+        # Download to a temp name and swap it in only on success, so a failed or
+        # truncated download never replaces (or masquerades as) a good copy
+        tmp_name = f"{item.name}.part"
+        tmp_path = os.path.join(data_dir, tmp_name)
+        if not item.download(to_path=data_dir, name=tmp_name):
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            logging.error("SharePoint Sync Failed: download unsuccessful")
+            return False
+        os.replace(tmp_path, local_path)
+        if remote_ts:
+            os.utime(local_path, (remote_ts, remote_ts))
         return True
     except Exception as e:
         logging.error(f"SharePoint Sync Failed: {e}")
         return False
 
+# Only these columns are used downstream (renamed to part_number/quantity/condition)
+INVENTORY_COLUMNS = ['PartNumber', 'Qty', 'Condition']
+INVENTORY_DTYPES = {'PartNumber': 'string', 'Condition': 'string'}
+
+# Last parsed inventory, reused across polls until the file's mtime changes
+_INV_CACHE = {'path': None, 'mtime': 0, 'index': None, 'sorted': None}
+
+def find_part_by_prefix(prefix, sorted_parts):
+    """Smart Lookup (StartsWith) via bisect on the sorted (part_number, row_order) list.
+    Returns the earliest inventory row's part number starting with prefix, or None."""
+    i = bisect_left(sorted_parts, (prefix,))
+    best = None
+    while i < len(sorted_parts) and sorted_parts[i][0].startswith(prefix):
+        if best is None or sorted_parts[i][1] < best[1]:
+            best = sorted_parts[i]
+        i += 1
+    return best[0] if best else None
+
 def load_inventory(account_for_sync=None):
+    """Returns (inventory_by_part, sorted_parts), or (None, None) if no inventory could be read."""
+    import pandas as pd
     if account_for_sync: download_from_sharepoint(account_for_sync)
     
     target_file = None
@@ -248,47 +320,66 @@ def load_inventory(account_for_sync=None):
     if not target_file and os.path.exists(os.path.join(project_root, 'data', 'inventory.csv')):
         target_file = os.path.join(project_root, 'data', 'inventory.csv')
 
-    if not target_file: return None
+    if not target_file: return None, None
+
+    mtime = os.stat(target_file).st_mtime
+    if _INV_CACHE['path'] == target_file and _INV_CACHE['mtime'] == mtime:
+        return _INV_CACHE['index'], _INV_CACHE['sorted']
 
     try:
         # Read file (handle Excel sheet logic)
         if target_file.endswith('.xlsx') or target_file.endswith('.xls'):
-            try:
-                df = pd.read_excel(target_file, sheet_name='InventoryIndex')
-            except:
-                df = pd.read_excel(target_file)
+            with pd.ExcelFile(target_file, **excel_read_options(target_file)) as xl:
+                sheet = 'InventoryIndex' if 'InventoryIndex' in xl.sheet_names else 0
+
+                # Dynamic Header Detection (for tables starting on row 5 etc) on a 10-row preread,
+                # so the full sheet is parsed exactly once with the resolved header and columns
+                preview = xl.parse(sheet, nrows=10)
+                header, header_names = 0, list(preview.columns)
+                for i in range(len(preview)):
+                    vals = [str(x).upper() for x in preview.iloc[i]]
+                    if any('PARTNUMBER' in x.replace(" ", "") for x in vals):
+                        header, header_names = i + 1, list(preview.iloc[i])
+                        break
+
+                usecols = [c for c in INVENTORY_COLUMNS if c in header_names]
+                if 'PartNumber' not in usecols: return None, None
+                dtype = {c: t for c, t in INVENTORY_DTYPES.items() if c in usecols}
+                df = xl.parse(sheet, header=header, usecols=usecols, dtype=dtype)
         else:
             df = pd.read_csv(target_file)
 
-        if df.empty: return None
-
-        # Dynamic Header Detection (for tables starting on row 5 etc)
-        header_idx = None
-        for i in range(min(10, len(df))):
-            vals = df.iloc[i].astype(str).str.upper().tolist()
-            if any('PARTNUMBER' in x.replace(" ", "") for x in vals):
-                header_idx = i
-                break
-        
-        if header_idx is not None:
-             if target_file.endswith('.xlsx'):
-                 df = pd.read_excel(target_file, sheet_name='InventoryIndex', header=header_idx+1)
+        if df.empty: return None, None
 
         df = df.rename(columns={
             'PartNumber': 'part_number', 'Qty': 'quantity', 'Condition': 'condition'
         })
         
-        if 'part_number' not in df.columns: return None
+        if 'part_number' not in df.columns: return None, None
+        # Blank PartNumber cells are not parts: drop them before str() turns them into 'NAN'/'<NA>'
+        df = df.dropna(subset=['part_number'])
         df['part_number'] = df['part_number'].astype(str).str.strip().str.upper()
-        return df
+        df = df[df['part_number'] != '']
+
+        # Hash index for O(1) part lookups (first row wins on duplicate part numbers)
+        records = df.drop_duplicates('part_number').to_dict('records')
+        inventory_by_part = {r['part_number']: r for r in records}
+        # Sorted (part_number, row_order) pairs for prefix lookups
+        sorted_parts = sorted((p, i) for i, p in enumerate(inventory_by_part))
+
+        _INV_CACHE.update(path=target_file, mtime=mtime, index=inventory_by_part, sorted=sorted_parts)
+        return inventory_by_part, sorted_parts
     except Exception as e:
         logging.error(f"DB Read Error: {e}")
-        return None
+        return None, None
+
+# (background, status font-weight) for normal rows vs MISSING / OUT OF STOCK / LOW STOCK rows
+ROW_STYLES = {False: ("#ffffff", "normal"), True: ("#ffe6e6", "bold")}
 
 def generate_html_report(results, original_subject, method):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    html = f"""
+    parts = [f"""
     <div style="font-family: Arial, sans-serif; color: #333;">
         <h3>Inventory Check Report</h3>
         <p><strong>Triggered by:</strong> {original_subject}<br>
@@ -307,13 +398,14 @@ def generate_html_report(results, original_subject, method):
                 </tr>
             </thead>
             <tbody>
-    """
+    """]
     
     for row in results:
-        bg_color = "#ffe6e6" if "MISSING" in row['status'] or "OUT OF STOCK" in row['status'] or "LOW STOCK" in row['status'] else "#ffffff"
-        font_weight = "bold" if bg_color == "#ffe6e6" else "normal"
+        status = row['status']
+        is_alert = "MISSING" in status or "OUT OF STOCK" in status or "LOW STOCK" in status
+        bg_color, font_weight = ROW_STYLES[is_alert]
         
-        html += f"""
+        parts.append(f"""
             <tr style="background-color: {bg_color};">
                 <td style="padding: 8px; border: 1px solid #ddd;">{row['part']}</td>
                 <td style="padding: 8px; border: 1px solid #ddd; font-weight: {font_weight}">{row['status']}</td>
@@ -322,67 +414,67 @@ def generate_html_report(results, original_subject, method):
                 <td style="padding: 8px; border: 1px solid #ddd;">{row['stock_qty']}</td>
                 <td style="padding: 8px; border: 1px solid #ddd;">{row['remaining']}</td>
             </tr>
-        """
-    html += "</tbody></table></div>"
-    return html
-
-def process_emails():
-    logging.info("Connecting to Azure...")
-    try:
-        account = Account(credentials, auth_flow_type='credentials', tenant_id=TENANT_ID)
-        if not account.authenticate(): return
-    except Exception as e:
-        return
-
-    df = load_inventory(account_for_sync=account)
-    mailbox = account.mailbox(resource=MONITORED_EMAIL)
-    inbox = mailbox.inbox_folder()
-
+        """)
+    parts.append("</tbody></table></div>")
+    return "".join(parts)
+
+def lookup_part(part, inventory_by_part, sorted_parts):
+    """Returns (display_part, inventory_row), with row None for unknown parts."""
+    # Find Part in DB
+    row = inventory_by_part.get(part)
+
+    # Smart Lookup (StartsWith)
+    if row is None:
+        matched = find_part_by_prefix(part, sorted_parts)
+        if matched:
+            row = inventory_by_part[matched]
+            part = f"{part} (Matched: {matched})"
+    return part, row
+
+def handle_message(message, account, inventory_by_part, sorted_parts):
+    """Checks one email against the inventory and sends the report."""
+    import pandas as pd
+
+    # One bad email (parse error, Graph throttling after O365's retries) must not stop the poll loop
     try:
-        messages = inbox.get_messages(limit=25, download_attachments=True)
-    except: return
-
-    for message in messages:
-        if message.is_read: continue
+        if message.is_read: return
         if "Inventory Alert" in message.subject:
             message.mark_as_read()
-            continue
-        if 'C CHECK' not in message.subject: continue
-            
-        logging.info(f"Processing Email: {message.subject}")
+            return
+        if 'C CHECK' not in message.subject: return
         
+        logging.info(f"Processing Email: {message.subject}")
+
+        # Attachments are only fetched for emails that pass the subject triage
+        if message.has_attachments:
+            message.attachments.download_attachments()
+    
         # Get List of {'part': 'XYZ', 'req_qty': 5}
-        items, method = extract_data_from_email(message)
-        
+        items, method = extract_data_from_email(message, inventory_by_part)
+    
         if not items:
             message.mark_as_read()
-            continue
+            return
 
-        if df is None: continue
+        if inventory_by_part is None: return
+
+        # One lookup per unique part (the subject and body often repeat the same part);
+        # every item still gets its own report row with its own req_qty
+        lookups = {p: lookup_part(p, inventory_by_part, sorted_parts) for p in {i['part'] for i in items}}
 
         results = []
         for item in items:
-            part = item['part']
             req_qty = item['req_qty']
-            
-            # Find Part in DB
-            match = df[df['part_number'] == part]
-            
-            # Smart Lookup (StartsWith)
-            if match.empty:
-                match = df[df['part_number'].str.startswith(part, na=False)]
-                if not match.empty:
-                    part = f"{part} (Matched: {match.iloc[0]['part_number']})"
+            part, row = lookups[item['part']]
 
-            if match.empty:
+            if row is None:
                 results.append({
                     'part': part, 'status': 'MISSING (Unknown Part)', 
                     'condition': 'N/A', 'req_qty': req_qty, 'stock_qty': 0, 'remaining': 0
                 })
             else:
-                row = match.iloc[0]
                 try: stock_qty = int(row['quantity'])
-                except: stock_qty = 0
+                except Exception: stock_qty = 0
                 condition = row.get('condition', 'N/A')
                 if pd.isna(condition): condition = 'N/A'
 
@@ -409,9 +501,41 @@ def process_emails():
             m.body = generate_html_report(results, message.subject, method)
             m.send()
             logging.info(f"Report sent.")
-        
+    
         message.mark_as_read()
         logging.info("Email marked as read.")
+    except Exception as e:
+        logging.error(f"Email Processing Error ({message.subject}): {e}")
+
+def process_emails():
+    logging.info("Connecting to Azure...")
+    try:
+        account = Account(credentials, auth_flow_type='credentials', tenant_id=TENANT_ID)
+        if not account.authenticate(): return
+    except Exception as e:
+        return
+
+    mailbox = account.mailbox(resource=MONITORED_EMAIL)
+    inbox = mailbox.inbox_folder()
+
+    # Filter/project on the server: only unread C CHECK mail (our own "Inventory Alert: C CHECK ..."
+    # replies included, so they still get marked read), without attachment bodies
+    q = mailbox.new_query()
+    query = q.chain_and(q.equals('is_read', False), q.contains('subject', 'C CHECK'))
+    query = query & q.select('subject', 'is_read', 'is_draft', 'has_attachments', 'body')
+
+    # Each email is network-bound (attachments, send, mark-as-read): handle them concurrently.
+    # The inventory index is only read, so it is safe to share between threads.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        # SharePoint sync + inventory parse run while the inbox query is in flight
+        inventory_future = ex.submit(load_inventory, account_for_sync=account)
+
+        try:
+            messages = inbox.get_messages(limit=25, query=query, download_attachments=False)
+        except Exception: return
+
+        inventory_by_part, sorted_parts = inventory_future.result()
+        list(ex.map(lambda m: handle_message(m, account, inventory_by_part, sorted_parts), messages))
 
 if __name__ == "__main__":
     logging.info(f"System Online. Monitoring: {MONITORED_EMAIL}")